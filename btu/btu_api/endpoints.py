@@ -12,6 +12,7 @@ import frappe
 # BTU Library
 from btu.btu_core.task_runner import TaskRunner
 from btu.btu_api import Sanchez, execute_job
+from btu.btu_api import scheduler
 
 
 @frappe.whitelist()
@@ -104,3 +105,30 @@ def test_function_ping_now_bytes():
 	new_sanchez.build_internals(func=execute_job, _args=None, _kwargs=queue_args)
 	http_result: bytes = new_sanchez.get_serialized_rq_job()
 	return http_result
+
+# The following endpoints let HTTP clients communicate with the BTU Scheduler daemon.
+# NOTE: Permissions are checked here; the functions in 'btu.btu_api.scheduler' do not check them.
+
+@frappe.whitelist()
+def scheduler_send_ping():
+	"""
+	Ask the BTU Scheduler daemon to reply with a 'pong'.
+	"""
+	frappe.only_for("System Manager")
+	return scheduler.send_ping()
+
+@frappe.whitelist()
+def scheduler_reload_task_schedule(task_schedule_id):
+	"""
+	Ask the BTU Scheduler daemon to reload a Task Schedule in RQ.
+	"""
+	frappe.has_permission("BTU Task Schedule", "write", doc=task_schedule_id, throw=True)
+	return scheduler.reload_task_schedule(task_schedule_id)
+
+@frappe.whitelist()
+def scheduler_cancel_task_schedule(task_schedule_id):
+	"""
+	Ask the BTU Scheduler daemon to cancel a Task Schedule in RQ.
+	"""
+	frappe.has_permission("BTU Task Schedule", "write", doc=task_schedule_id, throw=True)
+	return scheduler.cancel_task_schedule(task_schedule_id)
@@ -1,112 +1,289 @@
-""" btu/but_api/scheduler.py """
+""" btu/btu_api/scheduler.py """
 
+from dataclasses import dataclass
 from enum import Enum
-import time
-
-import json
+from functools import lru_cache
+import logging
+import os
 import pathlib
 import socket
+import struct
+import threading
+import time
+
+import msgspec
 import frappe
 
-# https://realpython.com/python-sockets/#application-protocol-header
+# NOTE: The BTU Scheduler daemon expects JSON, so the faster msgspec JSON encoder is used (instead of msgpack).
+_ENCODER = msgspec.json.Encoder()
+
+# Every message (in both directions) is prefixed with a 4-byte, big-endian length header.
+_HEADER = struct.Struct('>I')
+_MAX_FRAME = 64 * 1024  # replies are tiny; anything larger means the daemon is not speaking this protocol.
+
+
+class SchedulerProtocolError(Exception):
+	"""
+	The BTU Scheduler daemon replied with something other than a length-prefixed frame.
+	"""
+
+
+def _recv_exactly(sock, view):
+	"""
+	Fill a memoryview with bytes read from a socket, looping over short reads.
+	NOTE: MSG_WAITALL would not help; a socket with a timeout is non-blocking, so the kernel returns whatever is buffered.
+	"""
+	received = 0
+	while received < len(view):
+		count = sock.recv_into(view[received:])
+		if not count:
+			raise ConnectionError(f"Socket closed after receiving {received} of {len(view)} bytes.")
+		received += count
+
+
+def _recv_frame(sock, buffer):
+	"""
+	Read one length-prefixed frame from a socket, and return its body as bytes.
+	The 'buffer' is reused when the body fits; larger bodies get a temporary buffer that is not kept.
+	"""
+	_recv_exactly(sock, memoryview(buffer)[:_HEADER.size])
+	(frame_length,) = _HEADER.unpack_from(buffer)
+	if frame_length > _MAX_FRAME:
+		raise SchedulerProtocolError(f"Reply header announces {frame_length} bytes (limit is {_MAX_FRAME}).")
+	if frame_length > len(buffer):
+		buffer = bytearray(frame_length)
+	frame_view = memoryview(buffer)[:frame_length]
+	_recv_exactly(sock, frame_view)
+	return bytes(frame_view)
+
+
+@lru_cache(maxsize=8)
+def _absolute_socket_path(socket_str):
+	return str(pathlib.Path(socket_str).absolute())
+
+
+def get_socket_path():
+	"""
+	Returns the absolute path (as a string) to the BTU Scheduler daemon's Unix Domain Socket.
+	NOTE: Frappe clears the cached BTU Configuration document whenever it is saved.
+	"""
+	socket_str = frappe.get_cached_doc("BTU Configuration").path_to_btu_scheduler_uds
+	if not socket_str:
+		raise ValueError("BTU Configuration is missing a path to the Unix Domain Socket for the scheduler daemon.")
+	return _absolute_socket_path(socket_str)
+
+
+# Each thread keeps one persistent connection to the daemon, instead of connecting and closing per message.
+_CONNECTION_IDLE_TIMEOUT = 30  # seconds
+_connection = threading.local()
+# SOCK_CLOEXEC only closes the socket across exec(); a fork() child still inherits it (see _get_connection).
+# Python already creates sockets non-inheritable (PEP 446), so this just makes that explicit in one syscall.
+_SOCKET_TYPE = socket.SOCK_STREAM | getattr(socket, 'SOCK_CLOEXEC', 0)
+
+
+def _get_connection(socket_path):
+	"""
+	Returns a tuple of this thread's connection to the BTU Scheduler daemon, and whether it was reused.
+	Idle connections, connections to a different socket path, or connections inherited across a fork() are replaced.
+	"""
+	scheduler_socket = getattr(_connection, 'sock', None)
+	if scheduler_socket is not None:
+		is_idle = (time.monotonic() - _connection.last_used) > _CONNECTION_IDLE_TIMEOUT
+		# After a fork, parent and child would share one connection, and their frames could interleave.
+		is_inherited = _connection.pid != os.getpid()
+		if is_idle or is_inherited or _connection.path != socket_path:
+			_discard_connection()
+		else:
+			return scheduler_socket, True
+
+	# Socket options are set once here, when the connection is created; not each time it is reused.
+	scheduler_socket = socket.socket(socket.AF_UNIX, _SOCKET_TYPE)
+	try:
+		scheduler_socket.settimeout(5)  # Very important, otherwise indefinite wait time.
+		scheduler_socket.connect(socket_path)
+	except FileNotFoundError:
+		scheduler_socket.close()
+		raise FileNotFoundError(f"Path to socket file does not exists: '{socket_path}'")  # pylint: disable=raise-missing-from
+	except Exception:
+		scheduler_socket.close()
+		raise
+	_connection.sock = scheduler_socket
+	_connection.pid = os.getpid()
+	_connection.path = socket_path
+	_connection.buffer = bytearray(256)  # reused for every reply that fits.
+	_connection.last_used = time.monotonic()
+	return scheduler_socket, False
+
+
+def _discard_connection():
+	"""
+	Close this thread's connection to the BTU Scheduler daemon (if any).
+	"""
+	scheduler_socket = getattr(_connection, 'sock', None)
+	_connection.sock = None
+	_connection.buffer = None
+	if scheduler_socket is not None:
+		try:
+			scheduler_socket.close()
+		except OSError:
+			pass
+
+
+@dataclass(frozen=True, slots=True)
+class SchedulerResult():
+	"""
+	The outcome of sending a message to the BTU Scheduler daemon.
+	The raw response bytes are kept; use 'text' to decode them only when needed.
+	"""
+	ok: bool
+	response: bytes = b""
+	error: str = ""
+
+	@property
+	def text(self):
+		return self.response.decode('utf-8') if self.ok else self.error
+
+	def __str__(self):
+		return self.text
+
+	def __json__(self):
+		"""
+		Used by Frappe when a whitelisted function returns this object.
+		"""
+		return {"ok": self.ok, "response": self.response.decode('utf-8'), "error": self.error}
+
 
 # pylint: disable=invalid-name
 class RequestType(Enum):
 	create_task_schedule = 0
 	ping = 1
 	cancel_task_schedule = 2
+	create_task_schedules_batch = 3
 
-class SchedulerAPI():
-	"""
-	Static methods are for external use.
-	"""
 
-	@frappe.whitelist()
-	@staticmethod
-	def send_ping():
-		"""
-		Ask the BTU Scheduler to reply with a 'pong'
-		"""
-		response = SchedulerAPI().send_message(RequestType.ping, content=None)
-		return response
+@lru_cache(maxsize=1024)
+def _encode_cached(request_type_name, content):
+	return _ENCODER.encode({
+		'request_type': request_type_name,
+		'request_content': content
+	})
 
-	@frappe.whitelist()
-	@staticmethod
-	def reload_task_schedule(task_schedule_id):
-		"""
-		Ask the BTU Scheduler to reload the Task Schedule in RQ, using the latest information.
-		NOTE: This does not perform an immediate Task execution; it only refreshes the JQ Job and CRON schedule.
-		"""
-		response = SchedulerAPI().send_message(RequestType.create_task_schedule,
-		                                       content=task_schedule_id)
-		return response
 
-	@frappe.whitelist()
-	@staticmethod
-	def cancel_task_schedule(task_schedule_id):
-		"""
-		Ask the BTU Scheduler to cancel the Task Schedule in RQ.
-		"""
-		response = SchedulerAPI().send_message(RequestType.cancel_task_schedule,
-		                                       content=task_schedule_id)
-		return response
+def _encode_message(request_type: RequestType, content):
+	"""
+	Encode a message for the BTU Scheduler.  Messages with a string content (a Task Schedule ID) are cached.
+	"""
+	if not isinstance(request_type, RequestType):
+		raise Exception("Argument 'request_type' must be an enum of RequestType.")
+	if content is None or isinstance(content, str):
+		return _encode_cached(request_type.name, content)
+	return _ENCODER.encode({
+		'request_type': request_type.name,
+		'request_content': content
+	})
 
 
-	def send_message(self, request_type: RequestType, content):
+_PING_BYTES = _encode_message(RequestType.ping, None)  # the 'ping' message never changes.
 
-		if not isinstance(request_type, RequestType):
-			raise Exception("Argument 'request_type' must be an enum of RequestType.")
-		new_message = {
-			'request_type': request_type.name,
-			'request_content': content
-		}
-		message_as_string = json.dumps(new_message)
-		return self._send_message_to_scheduler_socket(message_as_string)
 
-	def _send_message_to_scheduler_socket(self, message, debug=False):
-		"""
-		Establish a connection to the BTU scheduler daemon's Unix Domain Socket, and send a message.
-		"""
-		if not isinstance(message, str):
-			raise TypeError("Argument 'message' must be a UTF-8 string.")
+def send_message(request_type: RequestType, content):
+	"""
+	Send a message to the BTU Scheduler daemon, and return a SchedulerResult.
+	"""
+	return _send_message_to_scheduler_socket(_encode_message(request_type, content))
 
-		socket_str = frappe.db.get_single_value("BTU Configuration", "path_to_btu_scheduler_uds")
-		if not socket_str:
-			raise ValueError("BTU Configuration is missing a path to the Unix Domain Socket for the scheduler daemon.")
 
-		# Create a UDS socket; connect to the port where the BTU Scheduler daemon is listening.
-		socket_path = pathlib.Path(socket_str)
-		if not socket_path.exists():
-			raise FileNotFoundError(f"Path to socket file does not exists: '{socket_path.absolute()}'")
+def _send_message_to_scheduler_socket(message):
+	"""
+	Send a message to the BTU scheduler daemon's Unix Domain Socket, reusing this thread's connection if possible.
+	"""
+	if not isinstance(message, bytes):
+		raise TypeError("Argument 'message' must be encoded bytes.")
+
+	socket_path = get_socket_path()
+	logger = frappe.logger("btu_scheduler")
+	debug = logger.isEnabledFor(logging.DEBUG)
 
+	for attempt in (1, 2):
 		try:
-			scheduler_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-			scheduler_socket.settimeout(5)  # Very important, otherwise indefinite wait time.
-			scheduler_socket.connect(str(socket_path.absolute()))
+			scheduler_socket, is_reused = _get_connection(socket_path)
 			if debug:
-				print(f"Connected to BTU Scheduler daemon via Unix Domain Socket at '{socket_path}'")
-				print(f"Blocking: {scheduler_socket.getblocking()}")
-				print(f"Timeout: {scheduler_socket.gettimeout()}")
+				logger.debug(f"Connected to BTU Scheduler daemon via Unix Domain Socket at '{socket_path}' (reused = {is_reused})")
+		except FileNotFoundError:
+			raise
 		except Exception as ex:
-			return f"Exception while connecting to BTU Scheduler socket: {str(ex)}"
+			return SchedulerResult(ok=False, error=f"Exception while connecting to BTU Scheduler socket: {str(ex)}")
 
-		message_bytes = message.encode('utf-8')
-		uds_response = None
 		try:
-			bytes_sent = scheduler_socket.send(message_bytes)
+			scheduler_socket.sendall(_HEADER.pack(len(message)) + message)
 			if debug:
-				print(f"Transmitted this quantity of bytes to UDS server: {bytes_sent}")
-			time.sleep(0.5)  # brief wait for server to reply
-			uds_response = scheduler_socket.recv(2048)  # response should be much smaller than 2kb
+				logger.debug(f"Transmitted {_HEADER.size + len(message)} bytes to UDS server.")
+			# recv() blocks (up to the timeout) until the daemon replies.  Read the length header, then the body.
+			uds_response = _recv_frame(scheduler_socket, _connection.buffer)
+			_connection.last_used = time.monotonic()
 			if debug:
-				print(f"Response (as bytes) from BTU Scheduler: {uds_response}")
+				logger.debug(f"Response (as bytes) from BTU Scheduler: {uds_response}")
+			return SchedulerResult(ok=True, response=uds_response)
+		except SchedulerProtocolError as ex:
+			_discard_connection()
+			return SchedulerResult(ok=False, error=f"Protocol mismatch with the BTU Scheduler daemon; upgrade the daemon to a release "
+			                                       f"that uses length-prefixed messages.  {ex}")
+		except ConnectionError as ex:  # includes BrokenPipeError and ConnectionResetError
+			_discard_connection()
+			if is_reused and attempt == 1:
+				continue  # the pooled connection went stale; retry once with a fresh one.
+			error = ex
 		except Exception as ex:
-			print(f"Exception while communicating with the BTU Scheduler daemon's Unix Domain Socket: {ex}")
-		finally:
-			scheduler_socket.close()
-			if debug:
-				print("Socket connection to BTU Scheduler daemon is now closed.")
+			_discard_connection()
+			error = ex
+		break
 
-		if uds_response:
-			uds_response = uds_response.decode('utf-8')  # return UTF-8 string
-		return uds_response
+	return SchedulerResult(ok=False, error=f"Exception while communicating with the BTU Scheduler daemon's Unix Domain Socket: {error}")
+
+
+def send_ping():
+	"""
+	Ask the BTU Scheduler to reply with a 'pong'
+	"""
+	response = _send_message_to_scheduler_socket(_PING_BYTES)
+	return response
+
+
+def reload_task_schedule(task_schedule_id):
+	"""
+	Ask the BTU Scheduler to reload the Task Schedule in RQ, using the latest information.
+	NOTE: This does not perform an immediate Task execution; it only refreshes the JQ Job and CRON schedule.
+	"""
+	response = send_message(RequestType.create_task_schedule, content=task_schedule_id)
+	return response
+
+
+def cancel_task_schedule(task_schedule_id):
+	"""
+	Ask the BTU Scheduler to cancel the Task Schedule in RQ.
+	"""
+	response = send_message(RequestType.cancel_task_schedule, content=task_schedule_id)
+	return response
+
+
+def reload_task_schedules(task_schedule_ids):
+	"""
+	Ask the BTU Scheduler to reload several Task Schedules in RQ, using a single message.
+	NOTE: Requires a BTU Scheduler daemon that supports the 'create_task_schedules_batch' request type.
+	"""
+	if not isinstance(task_schedule_ids, (list, tuple)) or not all(isinstance(each, str) for each in task_schedule_ids):
+		raise TypeError("Argument 'task_schedule_ids' must be a list of Task Schedule names (strings).")
+	if not task_schedule_ids:
+		return SchedulerResult(ok=True)  # nothing to send
+	response = send_message(RequestType.create_task_schedules_batch, content=list(task_schedule_ids))
+	return response
+
+
+class SchedulerAPI():
+	"""
+	Kept for backwards compatibility; prefer the module-level functions above.
+	"""
+	send_ping = staticmethod(send_ping)
+	reload_task_schedule = staticmethod(reload_task_schedule)
+	cancel_task_schedule = staticmethod(cancel_task_schedule)
+	reload_task_schedules = staticmethod(reload_task_schedules)
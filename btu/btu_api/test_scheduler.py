@@ -0,0 +1,213 @@
+# Copyright (c) 2022, Datahenge LLC and Contributors
+# See license.txt
+
+# pylint: disable=protected-access
+
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from btu.btu_api import scheduler
+
+
+class _TrickleSocket():
+	"""
+	Wraps a socket so that every recv_into() returns at most a few bytes, forcing short reads.
+	"""
+	def __init__(self, sock, max_bytes=3):
+		self.sock = sock
+		self.max_bytes = max_bytes
+
+	def recv_into(self, view, nbytes=0, flags=0):  # pylint: disable=unused-argument
+		return self.sock.recv_into(view, min(len(view), self.max_bytes))
+
+
+class TestSchedulerFraming(unittest.TestCase):
+
+	def setUp(self):
+		self.reader, self.writer = socket.socketpair()
+		self.reader.settimeout(5)
+
+	def tearDown(self):
+		self.reader.close()
+		self.writer.close()
+
+	def send_frame(self, body):
+		self.writer.sendall(scheduler._HEADER.pack(len(body)) + body)
+
+	def test_complete_frame(self):
+		self.send_frame(b"pong")
+		self.assertEqual(scheduler._recv_frame(self.reader, bytearray(256)), b"pong")
+
+	def test_short_reads(self):
+		body = b"x" * 100
+		self.send_frame(body)
+		trickle = _TrickleSocket(self.reader)
+		self.assertEqual(scheduler._recv_frame(trickle, bytearray(256)), body)
+
+	def test_frame_larger_than_buffer(self):
+		body = b"y" * 1000
+		buffer = bytearray(256)
+		self.send_frame(body)
+		self.assertEqual(scheduler._recv_frame(self.reader, buffer), body)
+		self.assertEqual(len(buffer), 256)
+
+	def test_peer_closes_mid_frame(self):
+		self.writer.sendall(scheduler._HEADER.pack(10) + b"abc")
+		self.writer.close()
+		with self.assertRaises(ConnectionError):
+			scheduler._recv_frame(self.reader, bytearray(256))
+
+	def test_oversized_header(self):
+		self.writer.sendall(scheduler._HEADER.pack(scheduler._MAX_FRAME + 1))
+		with self.assertRaises(scheduler.SchedulerProtocolError):
+			scheduler._recv_frame(self.reader, bytearray(256))
+
+	def test_unframed_reply(self):
+		# An older daemon replies with raw text; its first 4 bytes must not be trusted as a length.
+		self.writer.sendall(b"pong")
+		with self.assertRaises(scheduler.SchedulerProtocolError):
+			scheduler._recv_frame(self.reader, bytearray(256))
+
+
+class _FakeDaemon():
+	"""
+	A minimal BTU Scheduler daemon listening on a Unix Domain Socket in a temporary directory.
+	Modes:
+		'keep'               Reply to every frame, keeping the connection open.
+		'close_after_reply'  Reply to one frame, then close the connection.
+		'close_immediately'  Read one frame, then close the connection without replying.
+	"""
+	def __init__(self, mode='keep'):
+		self.mode = mode
+		self.accept_count = 0
+		self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+		self.path = os.path.join(self.directory.name, 'btu_scheduler.sock')
+		self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.server.bind(self.path)
+		self.server.listen()
+		threading.Thread(target=self._serve, daemon=True).start()
+
+	def close(self):
+		self.server.close()
+		self.directory.cleanup()
+
+	def _serve(self):
+		while True:
+			try:
+				conn, _ = self.server.accept()
+			except OSError:
+				return
+			self.accept_count += 1
+			threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+	def _handle(self, conn):
+		with conn:
+			while True:
+				try:
+					request = scheduler._recv_frame(conn, bytearray(256))
+				except (ConnectionError, OSError):
+					return
+				if self.mode == 'close_immediately':
+					return
+				reply = b"reply:" + request
+				conn.sendall(scheduler._HEADER.pack(len(reply)) + reply)
+				if self.mode == 'close_after_reply':
+					return
+
+
+class TestSchedulerConnection(unittest.TestCase):
+
+	def setUp(self):
+		scheduler._discard_connection()
+		self.daemons = []
+
+	def tearDown(self):
+		scheduler._discard_connection()
+		for daemon in self.daemons:
+			daemon.close()
+
+	def start_daemon(self, mode='keep'):
+		daemon = _FakeDaemon(mode)
+		self.daemons.append(daemon)
+		return daemon
+
+	def ping(self, daemon):
+		with patch.object(scheduler, 'get_socket_path', return_value=daemon.path):
+			return scheduler.send_ping()
+
+	def test_connection_is_reused(self):
+		daemon = self.start_daemon()
+		self.assertTrue(self.ping(daemon).ok)
+		self.assertTrue(self.ping(daemon).ok)
+		self.assertEqual(daemon.accept_count, 1)
+
+	def test_stale_connection_is_retried_once(self):
+		daemon = self.start_daemon('close_after_reply')
+		self.assertTrue(self.ping(daemon).ok)
+		result = self.ping(daemon)  # the pooled connection was closed by the daemon
+		self.assertTrue(result.ok)
+		self.assertEqual(result.response, b"reply:" + scheduler._PING_BYTES)
+		self.assertEqual(daemon.accept_count, 2)
+
+	def test_no_retry_on_fresh_connection(self):
+		daemon = self.start_daemon('close_immediately')
+		result = self.ping(daemon)
+		self.assertFalse(result.ok)
+		self.assertEqual(daemon.accept_count, 1)
+
+	def test_idle_connection_is_replaced(self):
+		daemon = self.start_daemon()
+		self.assertTrue(self.ping(daemon).ok)
+		scheduler._connection.last_used -= scheduler._CONNECTION_IDLE_TIMEOUT + 1
+		self.assertTrue(self.ping(daemon).ok)
+		self.assertEqual(daemon.accept_count, 2)
+
+	def test_connection_inherited_across_fork_is_replaced(self):
+		daemon = self.start_daemon()
+		self.assertTrue(self.ping(daemon).ok)
+		with patch.object(scheduler.os, 'getpid', return_value=os.getpid() + 1):  # as if this were a forked child
+			self.assertTrue(self.ping(daemon).ok)
+		self.assertEqual(daemon.accept_count, 2)
+
+	def test_new_socket_path_replaces_connection(self):
+		first_daemon = self.start_daemon()
+		second_daemon = self.start_daemon()
+		self.assertTrue(self.ping(first_daemon).ok)
+		self.assertTrue(self.ping(second_daemon).ok)
+		self.assertEqual(first_daemon.accept_count, 1)
+		self.assertEqual(second_daemon.accept_count, 1)
+
+	def test_batch_reload_frame(self):
+		daemon = self.start_daemon()
+		with patch.object(scheduler, 'get_socket_path', return_value=daemon.path):
+			result = scheduler.reload_task_schedules(["TS-0001", "TS-0002"])
+		# The fake daemon echoes the request body it received, so this is the exact frame on the wire.
+		self.assertTrue(result.ok)
+		self.assertEqual(result.response,
+		                 b'reply:{"request_type":"create_task_schedules_batch","request_content":["TS-0001","TS-0002"]}')
+
+	def test_batch_reload_empty_list_sends_nothing(self):
+		daemon = self.start_daemon()
+		with patch.object(scheduler, 'get_socket_path', return_value=daemon.path):
+			result = scheduler.reload_task_schedules([])
+		self.assertTrue(result.ok)
+		self.assertEqual(result.response, b"")
+		self.assertEqual(daemon.accept_count, 0)
+
+	def test_batch_reload_rejects_invalid_ids(self):
+		for invalid in ("TS-0001", '"TS-0001"', {"name": "TS-0001"}, ["TS-0001", 2], None):
+			with self.assertRaises(TypeError):
+				scheduler.reload_task_schedules(invalid)
+
+	def test_missing_socket_file(self):
+		daemon = self.start_daemon()
+		missing_path = os.path.join(daemon.directory.name, 'missing.sock')
+		with patch.object(scheduler, 'get_socket_path', return_value=missing_path):
+			with self.assertRaises(FileNotFoundError) as context:
+				scheduler.send_ping()
+		self.assertEqual(str(context.exception), f"Path to socket file does not exists: '{missing_path}'")
+		self.assertEqual(daemon.accept_count, 0)
@@ -5,7 +5,7 @@ import frappe
 from frappe.model.document import Document
 
 from btu.manual_tests import send_hello_email_to_user
-from btu.btu_api.scheduler import SchedulerAPI
+from btu.btu_api.scheduler import send_ping
 
 class BTUConfiguration(Document):
 
@@ -30,8 +30,8 @@ class BTUConfiguration(Document):
 		"""
 		Button sends a 'ping' to the BTU Scheduler daemon on its Unix Domain Socket.
 		"""
-		response = SchedulerAPI.send_ping()
-		frappe.msgprint(f"Response from BTU Scheduler daemon:<br>{response}")
+		result = send_ping()
+		frappe.msgprint(f"Response from BTU Scheduler daemon:<br>{result.text}")
 
 	@frappe.whitelist()
 	def button_resubmit_all_task_schedules(self):
@@ -23,7 +23,7 @@ from frappe.model.document import Document
 
 # BTU
 from btu import ( validate_cron_string, Result, get_system_datetime_now)
-from btu.btu_api.scheduler import SchedulerAPI
+from btu.btu_api import scheduler
 
 NoneType = type(None)
 cron_day_dictionary = {'Sun': 0, 'Mon': 1, 'Tue': 2, 'Wed': 3, 'Thu': 4, 'Fri': 5, 'Sat': 6}
@@ -35,7 +35,10 @@ class BTUTaskSchedule(Document):  # pylint: disable=too-many-instance-attributes
 		"""
 		After deleting this Task Schedule, delete the corresponding Redis data.
 		"""
-		self.cancel_schedule()
+		try:
+			self.cancel_schedule()
+		except Exception as ex:
+			frappe.msgprint(ex, indicator='red')  # still allow the deletion
 		# btu_core.redis_cancel_by_queue_job_id(self.redis_job_id)
 
 	def before_validate(self):
@@ -107,7 +110,10 @@ class BTUTaskSchedule(Document):  # pylint: disable=too-many-instance-attributes
 			doc_orig = self.get_doc_before_save()
 			if doc_orig and doc_orig.enabled != self.enabled:
 				# Request the BTU Scheduler to cancel (if status was not previously Disabled)
-				self.cancel_schedule()
+				try:
+					self.cancel_schedule()
+				except Exception as ex:
+					frappe.msgprint(ex, indicator='red')  # still allow the Task Schedule to be disabled
 
 # -----end of standard controller methods-----
 
@@ -115,22 +121,23 @@ class BTUTaskSchedule(Document):  # pylint: disable=too-many-instance-attributes
 		"""
 		Send a request to the BTU Scheduler background daemon to reload this Task Schedule in RQ.
 		"""
-		response = SchedulerAPI.reload_task_schedule(task_schedule_id=self.name)
-		if not response:
-			raise ConnectionError("Error, no response from BTU Task Scheduler daemon.  Check logs in directory '/etc/btu_scheduler.logs'")
-		if response.startswith('Exception while connecting'):
-			raise ConnectionError(response)
-		print(f"Response from BTU Scheduler: {response}")
-		frappe.msgprint(f"Response from BTU Scheduler daemon:<br>{response}")
+		result = scheduler.reload_task_schedule(task_schedule_id=self.name)
+		if not result.ok:
+			raise ConnectionError(f"{result.error}\nCheck logs in directory '/etc/btu_scheduler.logs'")
+		print(f"Response from BTU Scheduler: {result.text}")
+		frappe.msgprint(f"Response from BTU Scheduler daemon:<br>{result.text}")
 		if autosave:
 			self.save()
 
 	def cancel_schedule(self):
 		"""
 		Ask the BTU Scheduler daemon to cancel this Task Schedule in the Redis Queue.
+		Raises an exception (and keeps 'redis_job_id') if the daemon did not accept the request.
 		"""
-		response = SchedulerAPI.cancel_task_schedule(task_schedule_id=self.name)
-		message = f"Request = Cancel Task Schedule.\nResponse from BTU Scheduler: {response}"
+		result = scheduler.cancel_task_schedule(task_schedule_id=self.name)
+		if not result.ok:
+			raise ConnectionError(f"{result.error}\nCheck logs in directory '/etc/btu_scheduler.logs'")
+		message = f"Request = Cancel Task Schedule.\nResponse from BTU Scheduler: {result.text}"
 		print(message)
 		frappe.msgprint(message)
 		self.redis_job_id = ""
@@ -141,7 +148,7 @@ class BTUTaskSchedule(Document):  # pylint: disable=too-many-instance-attributes
 	@frappe.whitelist()
 	def get_last_execution_results(self):
 
-		# response = SchedulerAPI.reload_task_schedule(task_schedule_id=self.name)
+		# response = scheduler.reload_task_schedule(task_schedule_id=self.name)
 
 		import zlib
 		from frappe.utils.background_jobs import get_redis_conn
@@ -291,17 +298,20 @@ def resubmit_all_task_schedules():
 	"""
 	filters = { "enabled": True }
 	task_schedule_ids = frappe.db.get_all("BTU Task Schedule", filters=filters, pluck='name')
+	# NOTE: Each Task Schedule is submitted individually; deployed BTU Scheduler daemons do not yet support batch requests.
 	for task_schedule_id in task_schedule_ids:
+		doc_schedule = None
 		try:
 			doc_schedule = frappe.get_doc("BTU Task Schedule", task_schedule_id)
 			doc_schedule.validate()
 			doc_schedule.resubmit_task_schedule()
 		except Exception as ex:
-			message = f"Error from BTU Scheduler while submitting Task {doc_schedule.name} : {ex}"
+			message = f"Error from BTU Scheduler while submitting Task Schedule {task_schedule_id} : {ex}"
 			frappe.msgprint(message)
 			print(message)
-			doc_schedule.enabled = False
-			doc_schedule.save()
+			if doc_schedule:
+				doc_schedule.enabled = False
+				doc_schedule.save()
 
 def get_utc_timezone():
 	return pytz.timezone('UTC')